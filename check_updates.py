@@ -4,15 +4,38 @@ Steam Games Update Checker
 Monitors Steam games for updates by tracking depot manifest IDs using SteamCMD
 """
 
-import json
+import argparse
+import logging
 import os
 import sys
-import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from types import MappingProxyType
 from typing import Dict, List, Tuple, Optional
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from steam_build_tracker import SteamCMDTracker
+from steam_build_tracker import BuildInfo, SteamCMDTracker
+
+logger = logging.getLogger(__name__)
+
+# Mattermost message block for one update, filled with str.format_map
+MATTERMOST_UPDATE_TEMPLATE = (
+    "**Game:** {name}\n"
+    "**App ID:** {app_id}\n"
+    "**Old Version:** `{old_version}`\n"
+    "**New Version:** `{new_version}`\n"
+    "**Detected:** {update_time}\n"
+    "**Steam Store:** https://store.steampowered.com/app/{app_id}/\n"
+    "**SteamDB:** https://steamdb.info/app/{app_id}/patchnotes/"
+)
+
+# Keeps batched posts well below Mattermost's message length limit
+MATTERMOST_UPDATES_PER_POST = 20
+
+# How long to skip apps SteamCMD has no version info for (DLCs, tools, removed apps)
+UNAVAILABLE_TTL = timedelta(hours=24)
 
 
 class SteamUpdateChecker:
@@ -21,97 +44,226 @@ class SteamUpdateChecker:
     def __init__(self, games_file: str = "games.txt",
                  tracked_file: str = "tracked_games.json",
                  mattermost_webhook: str = None,
-                 steamcmd_path: str = None):
+                 steamcmd_path: str = None,
+                 max_workers: int = 4):
         self.games_file = games_file
         self.tracked_file = tracked_file
         self.mattermost_webhook = mattermost_webhook
+        self.max_workers = max_workers
+        self._last_content = None  # Tracked data as last read/written, see _tracked_content
         self.tracked_data = self._load_tracked_data()
         self.build_tracker = SteamCMDTracker(steamcmd_path)
+        self._http = self._create_http_session()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the HTTP session and the SteamCMD session"""
+        self._http.close()
+        self.build_tracker.close()
+
+    def _create_http_session(self) -> requests.Session:
+        """Create an HTTP session with keep-alive connection pooling and retries"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
     def _load_tracked_data(self) -> Dict:
         """Load previously tracked game data"""
         if os.path.exists(self.tracked_file):
-            with open(self.tracked_file, 'r') as f:
-                return json.load(f)
+            with open(self.tracked_file, 'rb') as f:
+                tracked_data = orjson.loads(f.read())
+            self._last_content = self._tracked_content(tracked_data)
+            return tracked_data
         return {}
 
+    @staticmethod
+    def _tracked_content(tracked_data: Dict) -> bytes:
+        """Serialize tracked data without last_checked, which changes on every run"""
+        return orjson.dumps(
+            {app_id: {key: value for key, value in entry.items() if key != 'last_checked'}
+             for app_id, entry in tracked_data.items()},
+            option=orjson.OPT_SORT_KEYS
+        )
+
     def _save_tracked_data(self):
-        """Save tracked game data"""
-        with open(self.tracked_file, 'w') as f:
-            json.dump(self.tracked_data, f, indent=2)
+        """Save tracked game data if anything but last_checked changed, replacing the file atomically"""
+        content = self._tracked_content(self.tracked_data)
+
+        if content == self._last_content:
+            logger.debug("Tracked data unchanged, not rewriting")
+            return
+
+        # sort_keys keeps the output (and the committed diffs) deterministic
+        new_bytes = orjson.dumps(
+            self.tracked_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        )
+
+        # Write to a temp file and swap it in, so a crash never leaves a truncated file
+        tmp_file = self.tracked_file + '.tmp'
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(new_bytes)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.tracked_file)
+        except BaseException:
+            # Don't leave a partial temp file behind
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+            raise
+
+        self._last_content = content
 
     def _parse_games_file(self) -> List[Tuple[str, str]]:
         """Parse games.txt and return list of (name, app_id) tuples"""
-        games = []
         with open(self.games_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                # Skip empty lines and comments
-                if not line or line.startswith('#'):
-                    continue
-
-                parts = line.split(',')
-                if len(parts) == 2:
-                    name, app_id = parts[0].strip(), parts[1].strip()
-                    games.append((name, app_id))
-                else:
-                    print(f"Warning: Invalid line format: {line}")
+            # Skip empty lines and comments
+            lines = [stripped for line in f.read().splitlines()
+                     if (stripped := line.strip()) and not stripped.startswith('#')]
 
-        return games
+        rows = [line.split(',') for line in lines]
+        games = [(parts[0].strip(), parts[1].strip()) for parts in rows if len(parts) == 2]
 
-    def _send_mattermost_notification(self, game_name: str, app_id: str,
-                                     old_version: str, new_version: str,
-                                     update_time: str):
-        """Send update notification to Mattermost"""
-        if not self.mattermost_webhook:
-            return
+        invalid = [line for line, parts in zip(lines, rows) if len(parts) != 2]
+        if invalid:
+            logger.warning("Warning: Invalid line format in %d line(s): %s", len(invalid), '; '.join(invalid))
 
-        try:
-            message = {
-                "text": f"### Steam Game Build Update Detected!\n\n"
-                       f"**Game:** {game_name}\n"
-                       f"**App ID:** {app_id}\n"
-                       f"**Old Version:** `{old_version}`\n"
-                       f"**New Version:** `{new_version}`\n"
-                       f"**Detected:** {update_time}\n"
-                       f"**Steam Store:** https://store.steampowered.com/app/{app_id}/\n"
-                       f"**SteamDB:** https://steamdb.info/app/{app_id}/patchnotes/"
-            }
+        # Each app only needs to be checked once, under the first name it's listed with
+        names_by_app_id = {}
+        for name, app_id in games:
+            names_by_app_id.setdefault(app_id, name)
+
+        if len(names_by_app_id) < len(games):
+            logger.debug("Ignoring %d duplicate App ID(s) in %s", len(games) - len(names_by_app_id), self.games_file)
+
+        return [(name, app_id) for app_id, name in names_by_app_id.items()]
 
-            response = requests.post(self.mattermost_webhook, json=message, timeout=10)
+    def _send_mattermost_notification(self, updates: List[Dict[str, str]]):
+        """Send one Mattermost post announcing the given updates"""
+        if len(updates) == 1:
+            header = "### Steam Game Build Update Detected!"
+        else:
+            header = f"### {len(updates)} Steam Game Build Updates Detected!"
+
+        message = {
+            "text": header + "\n\n" + "\n\n---\n\n".join(
+                MATTERMOST_UPDATE_TEMPLATE.format_map(update) for update in updates
+            )
+        }
+        names = ', '.join(update['name'] for update in updates)
+
+        try:
+            response = self._http.post(self.mattermost_webhook, json=message, timeout=10)
             response.raise_for_status()
-            print(f"  Mattermost notification sent for {game_name}")
+            logger.info("  Mattermost notification sent for %s", names)
 
         except requests.exceptions.RequestException as e:
-            print(f"  Error sending Mattermost notification: {e}")
+            logger.error("  Error sending Mattermost notification for %s: %s", names, e)
+
+    def _send_notifications(self, updates: List[Dict[str, str]]):
+        """Send queued updates to Mattermost, batched into as few posts as possible"""
+        batch = []
+        for update in updates:
+            batch.append(update)
+            if len(batch) == MATTERMOST_UPDATES_PER_POST:
+                self._send_mattermost_notification(batch)
+                batch = []
+
+        if batch:
+            self._send_mattermost_notification(batch)
+
+    def _cached_build_info(self, app_id: str) -> Optional[BuildInfo]:
+        """Rebuild the last retrieved build info from tracked data, if it has a change number"""
+        tracked = self.tracked_data.get(app_id, {})
+
+        # Entries written before change numbers were tracked can't be validated
+        if not tracked.get('change_number'):
+            return None
+
+        return BuildInfo(
+            app_id=app_id,
+            build_id=tracked.get('build_id'),
+            manifest_ids=tuple(tracked.get('all_manifests', ())),
+            depot_manifests=MappingProxyType(tracked.get('depot_manifests', {})),
+            primary_manifest=tracked.get('primary_manifest'),
+            change_number=tracked['change_number'],
+            checked_at=tracked.get('last_checked')
+        )
+
+    def _is_marked_unavailable(self, app_id: str) -> bool:
+        """Check if app_id was recently found to have no version info"""
+        unavailable_until = self.tracked_data.get(app_id, {}).get('unavailable_until')
+        return bool(unavailable_until) and datetime.fromisoformat(unavailable_until) > datetime.now()
+
+    def _fetch_build_infos(self, games: List[Tuple[str, str]]) -> Dict[str, Optional[BuildInfo]]:
+        """
+        Query SteamCMD for all games, returns app_id -> build info
+
+        Build info is None for apps without version info; apps SteamCMD
+        failed to query are left out.
+        """
+        app_ids = [app_id for _, app_id in games]
+        cached = {app_id: self._cached_build_info(app_id) for app_id in app_ids}
+
+        # max_workers bounds how many SteamCMD sessions hit Steam at once
+        return self.build_tracker.get_build_info_many(app_ids, cached, max_workers=self.max_workers)
 
     def check_updates(self) -> bool:
         """Check all games for updates. Returns True if any updates found."""
         games = self._parse_games_file()
         updates_found = False
+        notifications = []
 
-        print(f"Checking {len(games)} games for updates using SteamCMD...")
-        print(f"Timestamp: {datetime.now().isoformat()}")
-        print(f"Note: This may take a while (~30 seconds per game)")
-        print("-" * 60)
+        logger.info("Checking %d games for updates using SteamCMD...", len(games))
+        logger.info("Timestamp: %s", datetime.now().isoformat())
+        logger.info("Note: This may take a while (SteamCMD login plus a few seconds per game)")
+        logger.info("-" * 60)
 
+        unavailable = [(name, app_id) for name, app_id in games if self._is_marked_unavailable(app_id)]
+        for game_name, app_id in unavailable:
+            logger.info("Skipping %s (App ID: %s): no build info until %s",
+                        game_name, app_id, self.tracked_data[app_id]['unavailable_until'])
+        games = [game for game in games if game not in unavailable]
+
+        build_infos = self._fetch_build_infos(games)
+
+        # Process results in games.txt order so output and tracked data stay stable
         for game_name, app_id in games:
-            print(f"\nChecking: {game_name} (App ID: {app_id})")
+            logger.info("\nChecking: %s (App ID: %s)", game_name, app_id)
+
+            if app_id not in build_infos:
+                logger.warning("  Unable to retrieve build info (SteamCMD error)")
+                continue
 
-            # Get current build info from SteamCMD
-            build_info = self.build_tracker.get_build_info(app_id)
+            build_info = build_infos[app_id]
 
             if not build_info:
-                print(f"  Unable to retrieve build info")
-                print(f"  (This may be a DLC, unavailable app, or SteamCMD error)")
+                logger.warning("  Unable to retrieve build info")
+                logger.warning("  (This may be a DLC or unavailable app, skipping it for %d hours)",
+                               UNAVAILABLE_TTL.total_seconds() // 3600)
+                self.tracked_data.setdefault(app_id, {'name': game_name})['unavailable_until'] = (
+                    datetime.now() + UNAVAILABLE_TTL
+                ).isoformat()
                 continue
 
-            # Prefer build_id, fallback to primary_manifest
-            current_version = build_info.get('build_id') or build_info.get('primary_manifest')
-            update_time = build_info['checked_at']
+            current_version = self.build_tracker.get_version(build_info)
+            update_time = build_info.checked_at
 
             if not current_version:
-                print(f"  No version information available")
+                logger.warning("  No version information available")
                 continue
 
             # Check if this is a new update
@@ -120,68 +272,89 @@ class SteamUpdateChecker:
                 last_version = self.tracked_data[app_id].get('version') or self.tracked_data[app_id].get('manifest_id', '')
 
                 if current_version != last_version and last_version:
-                    print(f"  BUILD UPDATE DETECTED!")
-                    print(f"    Old version: {last_version}")
-                    print(f"    New version: {current_version}")
+                    logger.info("  BUILD UPDATE DETECTED!")
+                    logger.info("    Old version: %s", last_version)
+                    logger.info("    New version: %s", current_version)
                     updates_found = True
 
-                    # Send notification
-                    self._send_mattermost_notification(
-                        game_name, app_id, last_version, current_version, update_time
-                    )
+                    # Queue notification, sent once all games are processed
+                    notifications.append({
+                        'name': game_name,
+                        'app_id': app_id,
+                        'old_version': last_version,
+                        'new_version': current_version,
+                        'update_time': update_time
+                    })
                 elif current_version == last_version:
-                    print(f"  No updates")
-                    print(f"    Current version: {current_version}")
-                    print(f"    Last checked: {self.tracked_data[app_id].get('last_checked', 'N/A')}")
+                    logger.info("  No updates")
+                    logger.debug("    Current version: %s", current_version)
+                    logger.debug("    Last checked: %s", self.tracked_data[app_id].get('last_checked', 'N/A'))
                 else:
                     # First time tracking (last_version is empty)
-                    print(f"  First time tracking this game")
-                    print(f"    Current version: {current_version}")
+                    logger.info("  First time tracking this game")
+                    logger.debug("    Current version: %s", current_version)
             else:
-                print(f"  First time tracking this game")
-                print(f"    Current version: {current_version}")
-                if build_info.get('manifest_ids'):
-                    print(f"    Total depots: {len(build_info['manifest_ids'])}")
+                logger.info("  First time tracking this game")
+                logger.debug("    Current version: %s", current_version)
+                if build_info.manifest_ids:
+                    logger.debug("    Total depots: %d", len(build_info.manifest_ids))
 
             # Update tracked data
             self.tracked_data[app_id] = {
                 'name': game_name,
                 'version': current_version,  # Renamed from manifest_id to version
-                'build_id': build_info.get('build_id'),
-                'primary_manifest': build_info.get('primary_manifest'),
-                'all_manifests': build_info.get('manifest_ids', []),
-                'depot_count': len(build_info.get('manifest_ids', [])),
+                'build_id': build_info.build_id,
+                'primary_manifest': build_info.primary_manifest,
+                'all_manifests': list(build_info.manifest_ids),
+                'depot_manifests': dict(build_info.depot_manifests),
+                'depot_count': len(build_info.manifest_ids),
+                'change_number': build_info.change_number,
                 'last_checked': datetime.now().isoformat()
             }
 
-            # Small delay between games to avoid overwhelming Steam
-            time.sleep(2)
+        if notifications and self.mattermost_webhook:
+            self._send_notifications(notifications)
 
         # Save updated tracking data
         self._save_tracked_data()
-        print("\n" + "=" * 60)
-        print(f"Check complete. Updates found: {updates_found}")
+        logger.info("\n" + "=" * 60)
+        logger.info("Check complete. Updates found: %s", updates_found)
 
         return updates_found
 
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Check Steam games for build updates")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument('-q', '--quiet', action='store_true',
+                           help="Only print warnings and errors")
+    verbosity.add_argument('-v', '--verbose', action='store_true',
+                           help="Print per-game version details")
+    args = parser.parse_args()
+
+    if args.quiet:
+        level = logging.WARNING
+    elif args.verbose:
+        level = logging.DEBUG
+    else:
+        level = logging.INFO
+    logging.basicConfig(level=level, format='%(message)s')
+
     # Get Mattermost webhook from environment variable
     mattermost_webhook = os.environ.get('MATTERMOST_WEBHOOK_URL')
 
     if not mattermost_webhook:
-        print("Warning: MATTERMOST_WEBHOOK_URL environment variable not set")
-        print("Notifications will not be sent\n")
+        logger.warning("Warning: MATTERMOST_WEBHOOK_URL environment variable not set")
+        logger.warning("Notifications will not be sent\n")
 
     # Create checker and run
-    checker = SteamUpdateChecker(
+    with SteamUpdateChecker(
         games_file='games.txt',
         tracked_file='tracked_games.json',
         mattermost_webhook=mattermost_webhook
-    )
-
-    updates_found = checker.check_updates()
+    ) as checker:
+        updates_found = checker.check_updates()
 
     # Exit with code 1 if updates found (signals GitHub Actions to commit)
     sys.exit(1 if updates_found else 0)
@@ -4,249 +4,1052 @@ Steam Build Tracker using SteamCMD
 Tracks actual game builds by monitoring depot manifest IDs
 """
 
+import gzip
+import itertools
+import json
+import logging
+import os
 import subprocess
 import re
 import platform
-from typing import Optional, Dict, List
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Optional, Dict, Iterator, List, Mapping, Tuple
 from datetime import datetime
 
 
+logger = logging.getLogger(__name__)
+
+
+# VDF tokens: a quoted string (group 1 holds its contents) or a brace.
+# SteamCMD output is matched as bytes; the values we keep are ASCII digits,
+# so only those are decoded instead of every line of output
+_VDF_TOKEN_RE = re.compile(rb'"((?:[^"\\]|\\.)*)"|\{|\}')
+
+# Banner SteamCMD prints before each app's VDF block, group 2 is the change number.
+# The change number increases every time anything in the app's info changes,
+# so an unchanged change number means the build info is unchanged too.
+# Matches: AppID : 440, change number : 26047373/0
+_APP_BANNER_RE = re.compile(rb'AppID\s*:\s*(\d+)(?:,\s*change number\s*:\s*(\d+))?')
+
+# Failed login steps, after which SteamCMD keeps going but prints no app info
+# Matches: Logging in user 'anonymous' to Steam Public...FAILED (No Connection)
+_LOGIN_FAILED_RE = re.compile(rb'(?:Logging in|Connecting|Waiting for user info).*\.\.\.\s*FAILED')
+
+# Environment variables SteamCMD needs: executable lookup, its install/data
+# directory (HOME / USERPROFILE), temp files, locale, and SystemRoot, without
+# which networking fails on Windows
+_STEAMCMD_ENV_VARS = (
+    'PATH', 'HOME', 'USER', 'LANG', 'LC_ALL', 'TMPDIR',
+    'TEMP', 'TMP', 'SYSTEMROOT', 'USERPROFILE', 'APPDATA', 'LOCALAPPDATA'
+)
+_MIN_ENV = {name: os.environ[name] for name in _STEAMCMD_ENV_VARS if name in os.environ}
+
+# SteamCMD executable name used when no path is given
+_DEFAULT_STEAMCMD = {
+    'Linux': 'steamcmd',
+    'Windows': 'steamcmd.exe',
+    'Darwin': 'steamcmd.sh',  # macOS
+}.get(platform.system(), 'steamcmd')
+
+# Extra Popen arguments for SteamCMD: a pruned environment instead of a copy of
+# ours, and on Windows no console window for each run
+_POPEN_KWARGS = {'env': _MIN_ENV}
+if platform.system() == "Windows":
+    _POPEN_KWARGS['creationflags'] = subprocess.CREATE_NO_WINDOW
+else:
+    # Lets subprocess use posix_spawn instead of fork + exec, which copies the
+    # parent's page tables. Our own descriptors are non-inheritable anyway (PEP 446)
+    _POPEN_KWARGS['close_fds'] = False
+
+
+def _write_debug_output(debug_filename: str, lines: List[bytes]):
+    """Write raw SteamCMD output lines to a gzip-compressed debug file"""
+    try:
+        # compresslevel=1 is several times faster than the default and still
+        # shrinks the repetitive VDF text a lot
+        with gzip.open(debug_filename, 'wb', compresslevel=1) as f:
+            f.writelines(lines)
+        logger.debug("  Debug output saved to: %s", debug_filename)
+    except Exception as e:
+        logger.warning("  Warning: Could not save debug output: %s", e)
+
+
+@dataclass(frozen=True)
+class BuildInfo:
+    """
+    Build information for one Steam app
+
+    Immutable, so cached instances can be handed out to several callers.
+    """
+
+    __slots__ = ('app_id', 'build_id', 'manifest_ids', 'depot_manifests',
+                 'primary_manifest', 'change_number', 'checked_at')
+
+    app_id: str
+    build_id: Optional[str]  # Primary version identifier
+    manifest_ids: Tuple[str, ...]  # Depot manifest IDs in the order found
+    depot_manifests: Mapping[str, str]  # Depot ID -> manifest ID, read-only
+    primary_manifest: Optional[str]  # First depot's manifest (fallback)
+    change_number: Optional[str]  # Bumped on any appinfo change
+    checked_at: Optional[str]  # ISO timestamp of the query
+
+
+def _build_info_to_json(build_info: BuildInfo) -> str:
+    """Serialize build info for the on-disk cache"""
+    return json.dumps({
+        'build_id': build_info.build_id,
+        'manifest_ids': build_info.manifest_ids,
+        'depot_manifests': dict(build_info.depot_manifests),
+        'primary_manifest': build_info.primary_manifest,
+        'change_number': build_info.change_number,
+        'checked_at': build_info.checked_at
+    })
+
+
+def _build_info_from_json(app_id: str, data: str) -> BuildInfo:
+    """Deserialize build info stored by _build_info_to_json"""
+    fields = json.loads(data)
+    return BuildInfo(
+        app_id=app_id,
+        build_id=fields['build_id'],
+        manifest_ids=tuple(fields['manifest_ids']),
+        depot_manifests=MappingProxyType(fields['depot_manifests']),
+        primary_manifest=fields['primary_manifest'],
+        change_number=fields['change_number'],
+        checked_at=fields['checked_at']
+    )
+
+
+class VDFStreamParser:
+    """
+    Incremental single-pass parser for one app's VDF block from app_info_print
+
+    Text is fed in as SteamCMD produces it and tokenized into quoted strings and
+    braces. A stack of section keys tracks where we are, so values are recorded
+    as soon as they are seen:
+    - "gid" under depots -> <depot_id> -> manifests -> public
+    - "buildid" under depots -> branches -> public
+
+    Everything we track lives under "depots", so the app's other top-level
+    sections ("common", "config", "extended", ...) are only brace-counted.
+    With skip=True the whole block is only brace-counted, to find where it ends.
+
+    VDF format example:
+    "440"
+    {
+        "depots"
+        {
+            "441"  // Windows depot
+            {
+                "manifests"
+                {
+                    "public"
+                    {
+                        "gid"    "7234567890123456789"
+                    }
+                }
+            }
+            "branches"
+            {
+                "public"
+                {
+                    "buildid"       "20565005"
+                    "timeupdated"   "1761608349"
+                }
+            }
+        }
+    }
+    """
+
+    def __init__(self, detail: bool = True, skip: bool = False):
+        """
+        Initialize parser
+
+        Args:
+            detail: If False, only the version is needed - stop at the build ID and
+                    keep just the first depot manifest (the build ID fallback)
+            skip: If True, nothing is recorded, the block is only read to its end
+        """
+        self.detail = detail
+        self.skip = skip
+        self.build_id = None
+        self.depot_manifests = {}
+        self.started = False  # True once the top-level block has opened
+        self.done = False  # True once the top-level block has closed or, without detail, the build ID was found
+        self._gids = []
+        self._path = []  # Keys of the sections we are currently inside
+        self._key = None  # Pending key waiting for its value or section
+        self._pending = b''  # Unterminated quoted string continued in the next feed
+        self._skip_depth = 0  # Nesting depth inside a section we don't track
+
+    @property
+    def manifest_ids(self) -> List[str]:
+        """Manifest GIDs in the order found"""
+        # Remove duplicates while preserving order
+        return list(dict.fromkeys(self._gids))
+
+    def feed(self, text: bytes):
+        """
+        Parse the next piece of output (typically one line)
+
+        Args:
+            text: Raw output following what was fed before
+        """
+        if self.done:
+            return
+
+        text = self._pending + text
+        self._pending = b''
+        end = 0
+
+        for token in _VDF_TOKEN_RE.finditer(text):
+            end = token.end()
+            value = token.group(0)
+
+            if self._skip_depth:
+                if value == b'{':
+                    self._skip_depth += 1
+                elif value == b'}':
+                    self._skip_depth -= 1
+                    # Only a skipped top-level block ends with an empty path
+                    if not self._skip_depth and not self._path:
+                        self.done = True
+                        return
+                continue
+
+            if value == b'{':
+                if self.skip and not self._path:
+                    self._skip_depth = 1
+                    self.started = True
+                    continue
+                if len(self._path) == 1 and self._key != b'depots':
+                    self._skip_depth = 1
+                    self._key = None
+                    continue
+                self._path.append(self._key)
+                self._key = None
+                self.started = True
+            elif value == b'}':
+                if self._path:
+                    self._path.pop()
+                self._key = None
+                if self.started and not self._path:
+                    self.done = True
+                    return
+            elif self._key is None:
+                self._key = token.group(1)
+            else:
+                self._record(self._key, token.group(1))
+                self._key = None
+                if not self.detail and self.build_id:
+                    self.done = True
+                    return
+
+        # An unmatched quote is a string that continues in the next piece
+        quote = text.find(b'"', end)
+        if quote != -1:
+            self._pending = text[quote:]
+
+    def _record(self, key: bytes, value: bytes):
+        """Store a key/value pair if it is one we track"""
+        path = self._path
+
+        # Matches: "depots" { "441" { "manifests" { "public" { "gid" "123456" } } } }
+        if (key == b'gid' and len(path) >= 4 and path[-4] == b'depots'
+                and path[-2:] == [b'manifests', b'public']
+                and (self.detail or not self._gids)):
+            gid = value.decode('ascii', 'replace')
+            self.depot_manifests[path[-3].decode('ascii', 'replace')] = gid
+            self._gids.append(gid)
+
+        # Matches: "branches" { "public" { "buildid" "12345" } }
+        elif key == b'buildid' and self.build_id is None and path[-2:] == [b'branches', b'public']:
+            self.build_id = value.decode('ascii', 'replace')
+
+
+class RateLimiter:
+    """Token bucket limiting how often SteamCMD sessions are started"""
+
+    def __init__(self, rate_per_sec: float = 1.0, burst: int = 5):
+        """
+        Initialize rate limiter
+
+        Args:
+            rate_per_sec: Sustained number of acquisitions allowed per second
+            burst: Number of acquisitions allowed back to back before waiting
+        """
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, blocking only if the bucket is empty"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_sec)
+            self._last_refill = now
+
+            # Reserve the token now and sleep off the deficit, so concurrent
+            # callers queue up behind each other instead of all waking at once
+            self._tokens -= 1
+            wait = -self._tokens / self.rate_per_sec if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
 class SteamCMDTracker:
     """Track Steam game builds using SteamCMD"""
 
-    def __init__(self, steamcmd_path: str = None, debug: bool = False):
+    # Upper bound on apps per SteamCMD session, keeps argv short and limits
+    # how much a single malformed section can affect
+    MAX_BATCH_SIZE = 50
+
+    # Seconds to wait for the persistent session to finish logging in
+    LOGIN_TIMEOUT = 60
+
+    def __init__(self, steamcmd_path: str = None, debug: bool = False,
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 rate_limiter: RateLimiter = None,
+                 persistent: bool = True,
+                 cache_ttl: float = 300.0,
+                 cache_path: Optional[str] = None):
         """
         Initialize SteamCMD tracker
 
         Args:
             steamcmd_path: Path to steamcmd executable. If None, assumes it's in PATH
             debug: If True, save raw SteamCMD output to debug files
+            max_batch_size: Maximum number of apps queried in one SteamCMD session
+            rate_limiter: Limits how often SteamCMD is queried. If None, allows
+                          a burst of 5 queries and then 1 per second
+            persistent: If True, keep one logged-in SteamCMD process running and
+                        send it commands, instead of starting SteamCMD per batch
+            cache_ttl: Seconds a retrieved build info is reused for the same app
+                       instead of querying SteamCMD again. 0 disables the cache
+            cache_path: Optional SQLite file that also keeps the cache on disk, so
+                        runs started within cache_ttl of each other share it
         """
         self.debug = debug
+        self.max_batch_size = max_batch_size
+        self.persistent = persistent
+        self._limiter = rate_limiter or RateLimiter(rate_per_sec=1.0, burst=5)
+        self.cache_ttl = cache_ttl
 
-        if steamcmd_path:
-            self.steamcmd_path = steamcmd_path
-        else:
-            # Default paths based on platform
-            system = platform.system()
-            if system == "Linux":
-                self.steamcmd_path = "steamcmd"
-            elif system == "Windows":
-                self.steamcmd_path = "steamcmd.exe"
-            elif system == "Darwin":  # macOS
-                self.steamcmd_path = "steamcmd.sh"
-            else:
-                self.steamcmd_path = "steamcmd"
+        # app_id -> (time.monotonic() when retrieved, build info, parsed with detail)
+        self._cache: Dict[str, Tuple[float, BuildInfo, bool]] = {}
+
+        # On-disk cache, opened on first use. Batches may run on several threads
+        self.cache_path = cache_path
+        self._db = None
+        self._db_lock = threading.Lock()
+
+        # Long-lived SteamCMD process used when persistent is True
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._sentinel_ids = itertools.count(1)
 
-    def _execute_steamcmd(self, app_id: str, timeout: int = 60) -> Optional[str]:
+        # Writes debug output in the background, created on first use. Batches
+        # may finish on several threads, so creation is guarded by a lock
+        self._debug_pool = None
+        self._debug_lock = threading.Lock()
+
+        self.steamcmd_path = steamcmd_path or _DEFAULT_STEAMCMD
+
+        # Shared start of every SteamCMD command line. posix_spawn is only used for
+        # an executable given with a directory, so look it up in PATH once here
+        self._cmd_prefix = [shutil.which(self.steamcmd_path) or self.steamcmd_path, '+login', 'anonymous']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Shut down the persistent SteamCMD session, if one is running, and finish debug writes"""
+        with self._session_lock:
+            self._stop_session()
+
+        with self._debug_lock:
+            if self._debug_pool is not None:
+                self._debug_pool.shutdown(wait=True)
+                self._debug_pool = None
+
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def invalidate(self, app_id: str = None):
         """
-        Execute SteamCMD to get app info
+        Drop cached build info so the next lookup queries SteamCMD
 
         Args:
-            app_id: Steam App ID
-            timeout: Command timeout in seconds
+            app_id: App to drop. If None, the whole cache is cleared
+        """
+        if app_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(app_id, None)
+
+        with self._db_lock:
+            # Nothing to delete from a cache file that was never written
+            if self._db is None and not (self.cache_path and os.path.exists(self.cache_path)):
+                return
+            db = self._open_db()
+            if db is None:
+                return
+            with db:
+                if app_id is None:
+                    db.execute('DELETE FROM builds')
+                else:
+                    db.execute('DELETE FROM builds WHERE app_id = ?', (app_id,))
+
+    def _open_db(self) -> Optional[sqlite3.Connection]:
+        """Open the on-disk cache if cache_path is set. Call with _db_lock held."""
+        if self._db is None and self.cache_path and self.cache_ttl > 0:
+            db = sqlite3.connect(self.cache_path, check_same_thread=False)
+            # WAL lets a run read while another writes; NORMAL skips an fsync per commit
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('CREATE TABLE IF NOT EXISTS builds ('
+                       'app_id TEXT PRIMARY KEY, detail INTEGER, checked_at REAL, data TEXT)')
+            self._db = db
+
+        return self._db
+
+    def _get_disk_cached(self, app_id: str, detail: bool = True) -> Optional[BuildInfo]:
+        """Return build info stored on disk within cache_ttl seconds, or None"""
+        with self._db_lock:
+            db = self._open_db()
+            if db is None:
+                return None
+            row = db.execute('SELECT detail, checked_at, data FROM builds WHERE app_id = ?',
+                             (app_id,)).fetchone()
+
+        if not row:
+            return None
+
+        has_detail, checked_at, data = row
+        age = time.time() - checked_at
+        if age >= self.cache_ttl or (detail and not has_detail):
+            return None
+
+        build_info = _build_info_from_json(app_id, data)
+        # Keep it in memory for the rest of its lifetime
+        self._cache[app_id] = (time.monotonic() - age, build_info, bool(has_detail))
+        return build_info
+
+    def _store_cached(self, build_infos: Dict[str, Optional[BuildInfo]], detail: bool):
+        """Cache successfully retrieved build infos in memory and, if enabled, on disk"""
+        build_infos = {app_id: build_info for app_id, build_info in build_infos.items() if build_info}
+        if self.cache_ttl <= 0 or not build_infos:
+            return
+
+        now = time.monotonic()
+        for app_id, build_info in build_infos.items():
+            self._cache[app_id] = (now, build_info, detail)
+
+        with self._db_lock:
+            db = self._open_db()
+            if db is None:
+                return
+            checked_at = time.time()
+            with db:
+                db.executemany(
+                    'INSERT OR REPLACE INTO builds (app_id, detail, checked_at, data) VALUES (?, ?, ?, ?)',
+                    [(app_id, int(detail), checked_at, _build_info_to_json(build_info))
+                     for app_id, build_info in build_infos.items()]
+                )
+
+    def _get_cached(self, app_id: str, detail: bool = True) -> Optional[BuildInfo]:
+        """Return build info retrieved within cache_ttl seconds, or None"""
+        entry = self._cache.get(app_id)
+
+        if entry:
+            retrieved_at, build_info, has_detail = entry
+            if time.monotonic() - retrieved_at < self.cache_ttl and (has_detail or not detail):
+                return build_info
+
+        # Another run may have stored a fresher one on disk
+        return self._get_disk_cached(app_id, detail)
+
+    def _start_session(self) -> bool:
+        """
+        Launch a SteamCMD process that logs in and then waits for commands on stdin
+
+        Waits until the login has finished, so a failed login is noticed here
+        instead of looking like none of the queried apps have any info.
 
         Returns:
-            SteamCMD output or None if error
+            True if the process was started and logged in
         """
+        logger.info("  Starting persistent SteamCMD session...")
+
         try:
-            cmd = [
-                self.steamcmd_path,
-                '+login', 'anonymous',
-                '+app_info_print', app_id,
-                '+quit'
-            ]
-
-            print(f"  Executing SteamCMD for app {app_id}...")
-
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='replace',  # Replace invalid characters instead of crashing
-                timeout=timeout
+            self._session = subprocess.Popen(
+                self._cmd_prefix,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,  # Nobody drains it for the session's lifetime
+                **_POPEN_KWARGS
             )
+        except FileNotFoundError:
+            logger.error("  SteamCMD not found at: %s", self.steamcmd_path)
+            logger.error("  Please install SteamCMD first")
+            return False
+        except Exception as e:
+            logger.error("  Error executing SteamCMD: %s", e)
+            return False
 
-            if result.returncode != 0:
-                print(f"  SteamCMD returned error code: {result.returncode}")
-                if result.stderr:
-                    print(f"  Error output: {result.stderr[:200]}")
-                return None
+        # The echo runs once SteamCMD is done with +login and reads stdin
+        sentinel = f"LOGGED_IN_{next(self._sentinel_ids)}".encode()
+        logged_in = False
+        login_error = None
 
-            # Save debug output if enabled
-            if self.debug and result.stdout:
-                debug_filename = f"steamcmd_debug_{app_id}.txt"
-                try:
-                    with open(debug_filename, 'w', encoding='utf-8') as f:
-                        f.write(result.stdout)
-                    print(f"  Debug output saved to: {debug_filename}")
-                except Exception as e:
-                    print(f"  Warning: Could not save debug output: {e}")
+        watchdog = threading.Timer(self.LOGIN_TIMEOUT, self._session.kill)
+        watchdog.start()
+        try:
+            self._session.stdin.write(b'echo %s\n' % sentinel)
+            self._session.stdin.flush()
 
-            return result.stdout
+            for line in self._session.stdout:
+                if sentinel in line:
+                    logged_in = login_error is None
+                    break
+                if b'FAILED' in line and _LOGIN_FAILED_RE.search(line):
+                    login_error = line.strip().decode('utf-8', 'replace')
+        except OSError as e:
+            login_error = str(e)
+        finally:
+            watchdog.cancel()
 
-        except subprocess.TimeoutExpired:
-            print(f"  SteamCMD timed out after {timeout} seconds")
-            return None
-        except FileNotFoundError:
-            print(f"  SteamCMD not found at: {self.steamcmd_path}")
-            print("  Please install SteamCMD first")
-            return None
-        except Exception as e:
-            print(f"  Error executing SteamCMD: {e}")
-            return None
+        if not logged_in:
+            logger.error("  SteamCMD login failed: %s", login_error or 'no response')
+            self._stop_session()
 
-    def _parse_vdf_manifest_ids(self, vdf_output: str) -> List[str]:
+        return logged_in
+
+    def _stop_session(self):
+        """Ask the persistent SteamCMD session to quit, killing it if it doesn't. Call with the lock held."""
+        session, self._session = self._session, None
+
+        if session is None:
+            return
+
+        try:
+            session.communicate(b'quit\n', timeout=15)
+        except (subprocess.TimeoutExpired, OSError, ValueError):
+            session.kill()
+            session.wait()
+
+    def _query_session(self, app_ids: List[str], timeout: int = None,
+                       status: Optional[Dict] = None) -> Iterator[bytes]:
         """
-        Parse VDF output to extract depot manifest IDs
+        Get app info for one or more apps from the persistent SteamCMD session
 
-        VDF format example:
-        "depots"
-        {
-            "441"  // Windows depot
-            {
-                "manifests"
-                {
-                    "public"
-                    {
-                        "gid"    "7234567890123456789"
-                    }
-                }
-            }
-        }
+        The commands are followed by an echo of a unique sentinel; everything SteamCMD
+        prints before the sentinel belongs to this query. Output is always read up to
+        the sentinel, even if the generator is closed early, so the next query starts
+        in sync. If SteamCMD dies or times out, the session is discarded.
 
         Args:
-            vdf_output: Raw SteamCMD output
+            app_ids: Steam App IDs to query
+            timeout: Query timeout in seconds. If None, scales with the number of apps
+            status: Optional dict; status['failed'] is set to True if the query failed
 
-        Returns:
-            List of manifest GID values found
+        Yields:
+            Raw SteamCMD output lines
         """
-        manifest_ids = []
+        if timeout is None:
+            timeout = 60 + 15 * (len(app_ids) - 1)
+        if status is None:
+            status = {}
+        status['failed'] = True  # Until the sentinel shows up
+
+        with self._session_lock:
+            if self._session is None or self._session.poll() is not None:
+                if not self._start_session():
+                    return
+
+            session = self._session
+            sentinel = f"DONE_{next(self._sentinel_ids)}".encode()
+
+            # app_info_update 1 refreshes SteamCMD's local appinfo cache so the
+            # change numbers printed below are current
+            commands = ['app_info_update 1']
+            commands += [f'app_info_print {app_id}' for app_id in app_ids]
+            commands.append(f'echo {sentinel.decode()}')
+
+            self._limiter.acquire()
+
+            logger.info("  Querying SteamCMD session for app(s) %s...", ', '.join(app_ids))
+
+            try:
+                session.stdin.write(('\n'.join(commands) + '\n').encode())
+                session.stdin.flush()
+            except OSError as e:
+                logger.error("  Error writing to SteamCMD session: %s", e)
+                self._stop_session()
+                return
+
+            timed_out = threading.Event()
+
+            def kill_on_timeout():
+                timed_out.set()
+                session.kill()
+
+            watchdog = threading.Timer(timeout, kill_on_timeout)
+            watchdog.start()
+
+            debug_lines = [] if self.debug else None
+            found_sentinel = False
+
+            try:
+                for line in session.stdout:
+                    if sentinel in line:
+                        found_sentinel = True
+                        break
+                    if debug_lines is not None:
+                        debug_lines.append(line)
+                    yield line
+            finally:
+                # Caller may have stopped early - skip the rest of this query's output
+                if not found_sentinel:
+                    for line in session.stdout:
+                        if sentinel in line:
+                            found_sentinel = True
+                            break
+
+                watchdog.cancel()
+                status['failed'] = not found_sentinel
+
+                if not found_sentinel:
+                    if timed_out.is_set():
+                        logger.error("  SteamCMD timed out after %d seconds", timeout)
+                    else:
+                        logger.error("  SteamCMD session exited with code: %s", session.poll())
+                    self._stop_session()
+
+                if debug_lines:
+                    self._save_debug_output(app_ids, debug_lines)
+
+    def _save_debug_output(self, app_ids: List[str], lines: List[bytes]):
+        """Write raw SteamCMD output for app_ids to a debug file without blocking parsing"""
+        # Joining every ID of a full batch would exceed the file name length limit,
+        # so batches are named after their first app plus a checksum of all IDs
+        if len(app_ids) == 1:
+            debug_filename = f"steamcmd_debug_{app_ids[0]}.txt.gz"
+        else:
+            checksum = zlib.crc32(','.join(app_ids).encode())
+            debug_filename = f"steamcmd_debug_{app_ids[0]}_and_{len(app_ids) - 1}_more_{checksum:08x}.txt.gz"
 
-        # Pattern to match manifest GIDs in nested VDF format
-        # Matches: "public" { ... "gid" "1234567890" ... }
-        pattern = r'"public"\s*\{\s*"gid"\s+"(\d+)"'
+        with self._debug_lock:
+            if self._debug_pool is None:
+                self._debug_pool = ThreadPoolExecutor(max_workers=1)
+            self._debug_pool.submit(_write_debug_output, debug_filename, lines)
 
-        matches = re.findall(pattern, vdf_output)
+    def _execute_steamcmd(self, app_ids: List[str], timeout: int = None,
+                          status: Optional[Dict] = None) -> Iterator[bytes]:
+        """
+        Execute SteamCMD to get app info for one or more apps in a single session
 
-        if matches:
-            # Remove duplicates while preserving order
-            seen = set()
-            for manifest_id in matches:
-                if manifest_id not in seen:
-                    manifest_ids.append(manifest_id)
-                    seen.add(manifest_id)
+        Output is yielded line by line as SteamCMD produces it, so it can be
+        parsed while SteamCMD is still running. Closing the generator early
+        terminates SteamCMD.
 
-        return manifest_ids
+        Args:
+            app_ids: Steam App IDs to query
+            timeout: Command timeout in seconds. If None, scales with the number of apps
+            status: Optional dict; status['failed'] is set to True if SteamCMD could
+                    not be run, timed out or exited with an error
 
-    def _parse_vdf_depot_info(self, vdf_output: str) -> Dict[str, str]:
+        Yields:
+            Raw SteamCMD output lines (nothing if SteamCMD could not be started)
+        """
+        if timeout is None:
+            timeout = 60 + 15 * (len(app_ids) - 1)
+        if status is None:
+            status = {}
+        status['failed'] = True  # Until SteamCMD has run
+
+        # app_info_update 1 refreshes SteamCMD's local appinfo cache so the
+        # change numbers printed below are current
+        cmd = self._cmd_prefix + ['+app_info_update', '1']
+        for app_id in app_ids:
+            cmd += ['+app_info_print', app_id]
+        cmd.append('+quit')
+
+        self._limiter.acquire()
+
+        logger.info("  Executing SteamCMD for app(s) %s...", ', '.join(app_ids))
+
+        # stderr goes to a temp file so it can't fill up a pipe while we read stdout
+        with tempfile.TemporaryFile() as stderr_file:
+            try:
+                process = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=stderr_file,
+                    **_POPEN_KWARGS
+                )
+            except FileNotFoundError:
+                logger.error("  SteamCMD not found at: %s", self.steamcmd_path)
+                logger.error("  Please install SteamCMD first")
+                return
+            except Exception as e:
+                logger.error("  Error executing SteamCMD: %s", e)
+                return
+
+            timed_out = threading.Event()
+
+            def kill_on_timeout():
+                timed_out.set()
+                process.kill()
+
+            watchdog = threading.Timer(timeout, kill_on_timeout)
+            watchdog.start()
+
+            debug_lines = [] if self.debug else None
+            completed = False
+            login_error = None
+
+            try:
+                for line in process.stdout:
+                    if debug_lines is not None:
+                        debug_lines.append(line)
+                    if b'FAILED' in line and _LOGIN_FAILED_RE.search(line):
+                        login_error = line.strip().decode('utf-8', 'replace')
+                    yield line
+                completed = True
+            finally:
+                watchdog.cancel()
+
+                if not completed:
+                    # Caller has everything it needs, don't wait for SteamCMD to log out
+                    process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+                # Stopped early by the caller counts as success
+                status['failed'] = (timed_out.is_set() or login_error is not None
+                                    or (completed and process.returncode != 0))
+
+                if login_error:
+                    logger.error("  SteamCMD login failed: %s", login_error)
+                elif timed_out.is_set():
+                    logger.error("  SteamCMD timed out after %d seconds", timeout)
+                elif completed and process.returncode != 0:
+                    logger.error("  SteamCMD returned error code: %s", process.returncode)
+                    stderr_file.seek(0)
+                    stderr = stderr_file.read(200).decode('utf-8', errors='replace')
+                    if stderr:
+                        logger.error("  Error output: %s", stderr)
+
+                # Save debug output if enabled
+                if debug_lines:
+                    self._save_debug_output(app_ids, debug_lines)
+
+    def _build_info_from_parser(self, app_id: str, change_number: Optional[str],
+                                parser: VDFStreamParser,
+                                cached: Optional[BuildInfo] = None) -> Optional[BuildInfo]:
         """
-        Parse VDF output to extract depot IDs and their manifest GIDs
+        Build the build information for a single app from its parsed VDF block
+
+        Args:
+            app_id: Steam App ID
+            change_number: Change number from the app's banner, if any
+            parser: Parser that has consumed the app's VDF block
+            cached: Previously retrieved build info for this app. Reused if its
+                    change number is still current, in which case the block was
+                    only read past, not parsed (see _parse_app_blocks)
 
         Returns:
-            Dict mapping depot_id -> manifest_gid
+            BuildInfo or None if no version info found
         """
-        depot_manifests = {}
+        if cached and change_number and cached.change_number == change_number:
+            logger.debug("  App %s unchanged (change number %s), reusing cached build info", app_id, change_number)
+            return replace(cached, checked_at=datetime.now().isoformat())
+
+        # Build ID is the primary version identifier, manifest IDs are fallback/additional info
+        build_id = parser.build_id
+        manifest_ids = parser.manifest_ids
+
+        # Check if we have any version information
+        if not build_id and not manifest_ids:
+            logger.info("  No build ID or manifest IDs found for app %s", app_id)
+            logger.info("  This may be a DLC, tool, or unavailable app")
+            return None
 
-        # Pattern to match depot -> manifests -> public -> gid
-        # Matches: "441" { ... "manifests" { ... "public" { "gid" "123456" } } }
-        depot_section_pattern = r'"(\d+)"\s*\{[^}]*?"manifests"\s*\{[^}]*?"public"\s*\{\s*"gid"\s+"(\d+)"'
+        build_info = BuildInfo(
+            app_id=app_id,
+            build_id=build_id,
+            manifest_ids=tuple(manifest_ids),
+            depot_manifests=MappingProxyType(parser.depot_manifests),
+            primary_manifest=manifest_ids[0] if manifest_ids else None,
+            change_number=change_number,
+            checked_at=datetime.now().isoformat()
+        )
 
-        matches = re.findall(depot_section_pattern, vdf_output, re.DOTALL)
+        # Print what we found
+        if build_id:
+            logger.debug("  Found build ID for app %s: %s", app_id, build_id)
+        if manifest_ids:
+            logger.debug("  Found %d depot manifest(s) for app %s", len(manifest_ids), app_id)
 
-        for depot_id, manifest_id in matches:
-            depot_manifests[depot_id] = manifest_id
+        return build_info
 
-        return depot_manifests
+    def _query_batch(self, app_ids: List[str], cached: Optional[Dict[str, BuildInfo]] = None,
+                     detail: bool = True) -> Dict[str, Optional[BuildInfo]]:
+        """
+        Query SteamCMD for one batch of apps
 
-    def _parse_vdf_build_id(self, vdf_output: str) -> Optional[str]:
+        Uses the persistent session when enabled. If the session fails, it is
+        disabled for the rest of this tracker's life and the apps it didn't
+        return are queried again with a one-off SteamCMD run.
+
+        Args:
+            app_ids: Steam App IDs, at most max_batch_size
+            cached: Optional dict mapping app_id -> previously retrieved build info
+            detail: If False, only parse as far as needed for the version
+
+        Returns:
+            Dict mapping app_id -> BuildInfo, or None if SteamCMD has no version info
+            for the app. Apps that couldn't be queried because SteamCMD failed are left out
         """
-        Parse VDF output to extract the public branch build ID
+        status = {}
 
-        This is simpler and more reliable than tracking individual depot manifests.
+        if self.persistent:
+            results = self._parse_app_blocks(
+                self._query_session(app_ids, status=status), app_ids, cached, detail
+            )
 
-        VDF format example:
-        "branches"
+            if status['failed']:
+                logger.warning("  Persistent SteamCMD session failed, falling back to one SteamCMD run per batch")
+                self.persistent = False
+
+                missing = [app_id for app_id in app_ids if results[app_id] is None]
+                if missing:
+                    results.update(self._parse_app_blocks(
+                        self._execute_steamcmd(missing, status=status), missing, cached, detail
+                    ))
+        else:
+            results = self._parse_app_blocks(
+                self._execute_steamcmd(app_ids, status=status), app_ids, cached, detail
+            )
+
+        # Without a clean SteamCMD run, a missing app may just not have been printed yet
+        if status['failed']:
+            results = {app_id: info for app_id, info in results.items() if info is not None}
+
+        return results
+
+    def _parse_app_blocks(self, lines: Iterator[bytes], app_ids: List[str],
+                          cached: Optional[Dict[str, BuildInfo]] = None,
+                          detail: bool = True) -> Dict[str, Optional[BuildInfo]]:
+        """
+        Parse SteamCMD app_info_print output for app_ids as it streams in
+
+        SteamCMD prints a banner before each app's VDF block:
+        AppID : 440, change number : 26047373/0, last change : Tue Oct 28 21:38:50 2025
+        "440"
         {
-            "public"
-            {
-                "buildid"       "20565005"
-                "timeupdated"   "1761608349"
-            }
+            ...
         }
 
+        Each block is fed line by line to its own VDFStreamParser. Once the block
+        of the last requested app has closed, the line generator is closed so
+        SteamCMD isn't waited on any longer.
+
         Args:
-            vdf_output: Raw SteamCMD output
+            lines: Raw SteamCMD output lines
+            app_ids: Steam App IDs that were queried
+            cached: Optional dict mapping app_id -> previously retrieved build info
+            detail: If False, stop parsing each block once its version is known
 
         Returns:
-            Build ID string or None if not found
+            Dict mapping app_id -> BuildInfo or None if error
         """
-        # Pattern to match build ID in branches section
-        # Matches: "branches" { ... "public" { "buildid" "12345" } }
-        pattern = r'"branches"\s*\{[^}]*?"public"\s*\{[^}]*?"buildid"\s+"(\d+)"'
+        results = {app_id: None for app_id in app_ids}
+        remaining = set(app_ids)
+
+        # App block currently being read: (app_id, change_number, parser)
+        current = None
 
-        match = re.search(pattern, vdf_output, re.DOTALL)
+        try:
+            for line in lines:
+                # Look for the start of the next app's block
+                if current is None or not current[2].started:
+                    # Substring check first, most lines never need the regex
+                    banner = _APP_BANNER_RE.search(line) if b'AppID' in line else None
+                    banner_app_id = banner.group(1).decode('ascii') if banner else None
+                    if banner_app_id in remaining:
+                        change_number = banner.group(2)
+                        change_number = change_number and change_number.decode('ascii')
+
+                        # Unchanged since the cached build info, so the block only
+                        # needs to be read past, not parsed
+                        previous = (cached or {}).get(banner_app_id)
+                        unchanged = (bool(change_number) and previous is not None
+                                     and previous.change_number == change_number)
+
+                        current = (banner_app_id, change_number, VDFStreamParser(detail, skip=unchanged))
+                        continue
+
+                    # No banner, the block starts directly with an unindented "<app_id>"
+                    top_level_key = line.rstrip().strip(b'"').decode('ascii', 'replace')
+                    if current is None and not line[:1].isspace() and top_level_key in remaining:
+                        current = (top_level_key, None, VDFStreamParser(detail))
+
+                if current is None:
+                    continue
+
+                app_id, change_number, parser = current
+                parser.feed(line)
+
+                if parser.done:
+                    results[app_id] = self._build_info_from_parser(
+                        app_id, change_number, parser, (cached or {}).get(app_id)
+                    )
+                    remaining.discard(app_id)
+                    current = None
+
+                    if not remaining:
+                        break
+        finally:
+            lines.close()
+
+        return results
+
+    def get_build_info_batch(self, app_ids: List[str], cached: Optional[Dict[str, BuildInfo]] = None,
+                             detail: bool = True) -> Dict[str, Optional[BuildInfo]]:
+        """
+        Get build information for several Steam apps
 
-        if match:
-            return match.group(1)
+        Apps are queried in a single SteamCMD session (up to max_batch_size apps
+        per session), so the login cost is paid once per batch instead of per app.
+        Apps retrieved within the last cache_ttl seconds are not queried again.
 
-        return None
+        Args:
+            app_ids: Steam App IDs
+            cached: Optional dict mapping app_id -> previously retrieved build info.
+                    Apps whose change number has not moved reuse it instead of
+                    the freshly parsed values
+            detail: If False, only parse as far as needed for the version (see get_build_info)
 
-    def get_build_info(self, app_id: str) -> Optional[Dict]:
+        Returns:
+            Dict mapping app_id -> BuildInfo, or None if SteamCMD
+            has no version info for the app (DLC, tool, unavailable app). Apps that
+            couldn't be queried because SteamCMD failed are left out
         """
-        Get build information for a Steam app
+        results = {}
+        to_query = []
+
+        # Repeated IDs would make SteamCMD print the same app twice
+        for app_id in dict.fromkeys(app_ids):
+            build_info = self._get_cached(app_id, detail)
+            if build_info:
+                results[app_id] = build_info
+            else:
+                to_query.append(app_id)
+
+        for i in range(0, len(to_query), self.max_batch_size):
+            batch_results = self._query_batch(to_query[i:i + self.max_batch_size], cached, detail)
+            self._store_cached(batch_results, detail)
+            results.update(batch_results)
+
+        return results
+
+    def get_build_info_many(self, app_ids: List[str], cached: Optional[Dict[str, BuildInfo]] = None,
+                            detail: bool = True, max_workers: int = 4) -> Dict[str, Optional[BuildInfo]]:
+        """
+        Get build information for many Steam apps, querying batches in parallel
+
+        Without the persistent session, app IDs are split into batches of max_batch_size
+        and each batch is passed to get_build_info_batch on a thread pool. SteamCMD calls
+        are subprocess-bound, so threads are enough. The persistent session serves one
+        query at a time, so with it the batches are simply queried one after another.
 
         Args:
-            app_id: Steam App ID
+            app_ids: Steam App IDs
+            cached: Optional dict mapping app_id -> previously retrieved build info
+                    (see get_build_info_batch)
+            detail: If False, only parse as far as needed for the version (see get_build_info)
+            max_workers: Maximum number of batches queried at once (persistent=False only)
 
         Returns:
-            Dict with build info or None if error:
-            {
-                'app_id': '440',
-                'build_id': '20565005',  # Primary version identifier
-                'manifest_ids': ['123456789', '987654321'],
-                'depot_manifests': {'441': '123456789', '442': '987654321'},
-                'primary_manifest': '123456789',  # First depot's manifest (fallback)
-                'checked_at': '2025-10-29T12:00:00'
-            }
+            Dict mapping app_id -> build info (see get_build_info_batch)
         """
-        output = self._execute_steamcmd(app_id)
+        app_ids = list(dict.fromkeys(app_ids))
+        batches = [app_ids[i:i + self.max_batch_size] for i in range(0, len(app_ids), self.max_batch_size)]
 
-        if not output:
-            return None
+        # Threads would only queue up on the session lock
+        if len(batches) <= 1 or self.persistent:
+            return self.get_build_info_batch(app_ids, cached, detail)
 
-        # Parse build ID (primary version identifier)
-        build_id = self._parse_vdf_build_id(output)
+        results = {}
 
-        # Parse manifest IDs (fallback/additional info)
-        manifest_ids = self._parse_vdf_manifest_ids(output)
-        depot_manifests = self._parse_vdf_depot_info(output)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.get_build_info_batch, batch, cached, detail) for batch in batches]
+            for future in as_completed(futures):
+                results.update(future.result())
 
-        # Check if we have any version information
-        if not build_id and not manifest_ids:
-            print(f"  No build ID or manifest IDs found for app {app_id}")
-            print(f"  This may be a DLC, tool, or unavailable app")
-            return None
+        return results
 
-        build_info = {
-            'app_id': app_id,
-            'build_id': build_id,
-            'manifest_ids': manifest_ids,
-            'depot_manifests': depot_manifests,
-            'primary_manifest': manifest_ids[0] if manifest_ids else None,
-            'checked_at': datetime.now().isoformat()
-        }
+    def get_build_info(self, app_id: str, detail: bool = True) -> Optional[BuildInfo]:
+        """
+        Get build information for a Steam app
 
-        # Print what we found
-        if build_id:
-            print(f"  Found build ID: {build_id}")
-        if manifest_ids:
-            print(f"  Found {len(manifest_ids)} depot manifest(s)")
+        Args:
+            app_id: Steam App ID
+            detail: If False, parsing stops as soon as the build ID is found and
+                    only the first depot manifest is collected. Enough for
+                    get_version(), but manifest_ids/depot_manifests are partial
 
-        return build_info
+        Returns:
+            BuildInfo or None if error:
+            BuildInfo(
+                app_id='440',
+                build_id='20565005',
+                manifest_ids=('123456789', '987654321'),
+                depot_manifests={'441': '123456789', '442': '987654321'},
+                primary_manifest='123456789',
+                change_number='26047373',
+                checked_at='2025-10-29T12:00:00'
+            )
+        """
+        return self.get_build_info_batch([app_id], detail=detail).get(app_id)
+
+    @staticmethod
+    def get_version(build_info: BuildInfo) -> Optional[str]:
+        """
+        Get the version identifier used for update detection
+
+        Args:
+            build_info: Build info as returned by get_build_info
 
-    def has_build_changed(self, app_id: str, last_version: str) -> tuple[bool, Optional[Dict]]:
+        Returns:
+            Build ID, or the primary manifest ID if the app has no build ID
+        """
+        # Prefer build_id, fallback to primary_manifest
+        return build_info.build_id or build_info.primary_manifest
+
+    def has_build_changed(self, app_id: str, last_version: str) -> tuple[bool, Optional[BuildInfo]]:
         """
         Check if build has changed since last known version
 
@@ -255,15 +1058,14 @@ class SteamCMDTracker:
             last_version: Previously tracked build ID or manifest ID
 
         Returns:
-            Tuple of (changed: bool, build_info: Dict or None)
+            Tuple of (changed: bool, build_info: BuildInfo or None)
         """
-        build_info = self.get_build_info(app_id)
+        build_info = self.get_build_info(app_id, detail=False)
 
         if not build_info:
             return False, None
 
-        # Prefer build_id, fallback to primary_manifest
-        current_version = build_info.get('build_id') or build_info.get('primary_manifest')
+        current_version = self.get_version(build_info)
 
         if not current_version:
             return False, None
@@ -272,9 +1074,9 @@ class SteamCMDTracker:
         changed = current_version != last_version
 
         if changed:
-            print(f"  Build changed!")
-            print(f"    Old version: {last_version}")
-            print(f"    New version: {current_version}")
+            logger.info("  Build changed!")
+            logger.info("    Old version: %s", last_version)
+            logger.info("    New version: %s", current_version)
 
         return changed, build_info
 
@@ -294,18 +1096,18 @@ def test_tracker():
 
     if build_info:
         print("\nSuccess! Build info retrieved:")
-        print(f"  App ID: {build_info['app_id']}")
-        if build_info.get('build_id'):
-            print(f"  Build ID: {build_info['build_id']}")
-        if build_info.get('primary_manifest'):
-            print(f"  Primary Manifest: {build_info['primary_manifest']}")
-        if build_info.get('manifest_ids'):
-            print(f"  Total Depots: {len(build_info['manifest_ids'])}")
-        print(f"  Checked At: {build_info['checked_at']}")
-
-        if build_info.get('depot_manifests'):
+        print(f"  App ID: {build_info.app_id}")
+        if build_info.build_id:
+            print(f"  Build ID: {build_info.build_id}")
+        if build_info.primary_manifest:
+            print(f"  Primary Manifest: {build_info.primary_manifest}")
+        if build_info.manifest_ids:
+            print(f"  Total Depots: {len(build_info.manifest_ids)}")
+        print(f"  Checked At: {build_info.checked_at}")
+
+        if build_info.depot_manifests:
             print("\n  Depot Details:")
-            for depot_id, manifest_id in build_info['depot_manifests'].items():
+            for depot_id, manifest_id in build_info.depot_manifests.items():
                 print(f"    Depot {depot_id}: {manifest_id}")
     else:
         print("\nFailed to retrieve build info")
@@ -313,4 +1115,5 @@ def test_tracker():
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG, format='%(message)s')
     test_tracker()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Stand-in for steamcmd used by the tests
+
+Understands the commands the tracker sends, both as +command arguments and as
+lines on stdin (persistent session), and prints canned app_info output.
+
+Options before the SteamCMD arguments change its behavior:
+    --fail-login      Report the anonymous login as FAILED and print no app info
+    --exit-code N     Exit with code N after the +command arguments have run
+    --no-echo         Ignore echo commands, so sentinels never show up
+"""
+
+import sys
+
+# app_id -> (build ID, [(depot ID, manifest GID)])
+APPS = {
+    '440': ('20565005', [('441', '2286724010119636077'), ('442', '1118032470228587934')]),
+    '730': ('20535897', [('731', '3116891513858869271')]),
+}
+
+
+def print_app_info(app_id):
+    if app_id not in APPS:
+        print(f"No app info for AppID {app_id} found, requesting...")
+        return
+
+    build_id, depots = APPS[app_id]
+    print(f"AppID : {app_id}, change number : 1000{app_id}/0, last change : Tue Oct 28 21:38:50 2025")
+    lines = [
+        f'"{app_id}"',
+        '{',
+        '\t"common"',
+        '\t{',
+        f'\t\t"name"\t\t"Game {app_id}"',
+        '\t\t"public"\t\t"1"',
+        '\t}',
+        '\t"depots"',
+        '\t{',
+    ]
+    for depot_id, gid in depots:
+        lines += [
+            f'\t\t"{depot_id}"',
+            '\t\t{',
+            '\t\t\t"manifests"',
+            '\t\t\t{',
+            '\t\t\t\t"public"',
+            '\t\t\t\t{',
+            f'\t\t\t\t\t"gid"\t\t"{gid}"',
+            '\t\t\t\t}',
+            '\t\t\t}',
+            '\t\t}',
+        ]
+    lines += [
+        '\t\t"branches"',
+        '\t\t{',
+        '\t\t\t"public"',
+        '\t\t\t{',
+        f'\t\t\t\t"buildid"\t\t"{build_id}"',
+        '\t\t\t}',
+        '\t\t}',
+        '\t}',
+        '}',
+    ]
+    print('\n'.join(lines))
+
+
+def run(commands, options):
+    for command in commands:
+        if not command:
+            continue
+        name, args = command[0], command[1:]
+
+        if name == 'login':
+            result = 'FAILED (No Connection)' if options['fail_login'] else 'OK'
+            print(f"Logging in user 'anonymous' to Steam Public...{result}")
+        elif name == 'app_info_print':
+            # Like SteamCMD, nothing to print without a connection
+            if not options['fail_login']:
+                print_app_info(args[0])
+        elif name == 'echo' and not options['no_echo']:
+            print(' '.join(args))
+        elif name == 'quit':
+            sys.stdout.flush()
+            sys.exit(options['exit_code'])
+
+        sys.stdout.flush()
+
+
+def main():
+    argv = sys.argv[1:]
+    options = {'fail_login': False, 'exit_code': 0, 'no_echo': False}
+
+    while argv and argv[0].startswith('--'):
+        option = argv.pop(0)
+        if option == '--fail-login':
+            options['fail_login'] = True
+        elif option == '--exit-code':
+            options['exit_code'] = int(argv.pop(0))
+        elif option == '--no-echo':
+            options['no_echo'] = True
+
+    commands = []
+    for arg in argv:
+        if arg.startswith('+'):
+            commands.append([arg[1:]])
+        elif commands:
+            commands[-1].append(arg)
+
+    print("Steam Console Client (c) Valve Corporation")
+    run(commands, options)
+
+    for line in sys.stdin:
+        run([line.split()], options)
+
+    sys.exit(options['exit_code'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Tests for SteamUpdateChecker: unavailable markers, tracked data writes and
+Mattermost batching
+
+SteamCMD is replaced by fake_steamcmd.py, which knows apps 440 and 730.
+
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check_updates
+from check_updates import MATTERMOST_UPDATES_PER_POST, SteamUpdateChecker
+from test_steam_build_tracker import make_steamcmd
+
+
+class CheckerTestCase(unittest.TestCase):
+    """Temp directory with games.txt, tracked data file and a fake steamcmd"""
+
+    def setUp(self):
+        # The checker reports skipped and failed games as warnings, keep test output clean
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.games_file = os.path.join(self.tmp_dir, 'games.txt')
+        self.tracked_file = os.path.join(self.tmp_dir, 'tracked_games.json')
+        self.write_games("Team Fortress 2,440\nMissing Game,999\n")
+
+    def write_games(self, text):
+        with open(self.games_file, 'w') as f:
+            f.write(text)
+
+    def write_tracked(self, tracked_data):
+        with open(self.tracked_file, 'wb') as f:
+            f.write(orjson.dumps(tracked_data))
+
+    def read_tracked(self):
+        with open(self.tracked_file, 'rb') as f:
+            return orjson.loads(f.read())
+
+    def make_checker(self, *options, persistent=True, **kwargs):
+        checker = SteamUpdateChecker(
+            games_file=self.games_file,
+            tracked_file=self.tracked_file,
+            steamcmd_path=make_steamcmd(self.tmp_dir, *options),
+            **kwargs
+        )
+        checker.build_tracker.persistent = persistent
+        self.addCleanup(checker.close)
+        return checker
+
+    def run_checker(self, *options, **kwargs):
+        with self.make_checker(*options, **kwargs) as checker:
+            return checker.check_updates()
+
+
+@unittest.skipIf(sys.platform == 'win32', "fake steamcmd is started through a shell script")
+class UnavailableMarkerTest(CheckerTestCase):
+
+    def test_missing_app_after_clean_run_is_marked(self):
+        self.run_checker()
+        tracked = self.read_tracked()
+
+        unavailable_until = datetime.fromisoformat(tracked['999']['unavailable_until'])
+        self.assertGreater(unavailable_until, datetime.now() + timedelta(hours=23))
+        self.assertEqual(tracked['440']['version'], '20565005')
+        self.assertNotIn('unavailable_until', tracked['440'])
+
+    def test_failed_run_does_not_mark(self):
+        self.run_checker('--exit-code 1', persistent=False)
+        tracked = self.read_tracked()
+
+        self.assertNotIn('999', tracked)
+        self.assertEqual(tracked['440']['version'], '20565005')
+
+    def test_failed_login_does_not_mark(self):
+        self.run_checker('--fail-login')
+
+        self.assertEqual(self.read_tracked(), {})
+
+    def test_marked_app_is_skipped_before_querying(self):
+        unavailable_until = (datetime.now() + timedelta(hours=1)).isoformat()
+        self.write_tracked({'440': {'name': 'Team Fortress 2', 'unavailable_until': unavailable_until}})
+
+        with self.make_checker() as checker:
+            with mock.patch.object(checker.build_tracker, 'get_build_info_many',
+                                   wraps=checker.build_tracker.get_build_info_many) as get_build_info_many:
+                checker.check_updates()
+
+        queried = get_build_info_many.call_args.args[0]
+        self.assertNotIn('440', queried)
+        self.assertIn('999', queried)
+        self.assertEqual(self.read_tracked()['440'],
+                         {'name': 'Team Fortress 2', 'unavailable_until': unavailable_until})
+
+    def test_expired_marker_is_cleared_by_successful_lookup(self):
+        unavailable_until = (datetime.now() - timedelta(minutes=1)).isoformat()
+        self.write_tracked({'440': {'name': 'Team Fortress 2', 'unavailable_until': unavailable_until}})
+
+        self.run_checker()
+        tracked = self.read_tracked()
+
+        self.assertEqual(tracked['440']['version'], '20565005')
+        self.assertNotIn('unavailable_until', tracked['440'])
+
+
+@unittest.skipIf(sys.platform == 'win32', "fake steamcmd is started through a shell script")
+class TrackedDataWriteTest(CheckerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.write_games("Team Fortress 2,440\nCounter-Strike 2,730\n")
+
+    def test_only_last_checked_changed_leaves_file_untouched(self):
+        self.run_checker()
+        with open(self.tracked_file, 'rb') as f:
+            first = f.read()
+        first_mtime = os.stat(self.tracked_file).st_mtime_ns
+
+        self.run_checker()
+        with open(self.tracked_file, 'rb') as f:
+            second = f.read()
+
+        self.assertEqual(second, first)
+        self.assertEqual(os.stat(self.tracked_file).st_mtime_ns, first_mtime)
+
+    def test_version_change_rewrites_file(self):
+        self.run_checker()
+        tracked = self.read_tracked()
+        tracked['440'].update(version='1', build_id='1', change_number='1')
+        self.write_tracked(tracked)
+
+        self.assertTrue(self.run_checker())
+        self.assertEqual(self.read_tracked()['440']['version'], '20565005')
+
+    def test_no_temp_file_left_behind(self):
+        self.run_checker()
+
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ['games.txt', 'steamcmd', 'tracked_games.json'])
+
+    def test_failed_replace_removes_temp_file(self):
+        checker = self.make_checker()
+        checker.tracked_data = {'440': {'name': 'Team Fortress 2', 'version': '1'}}
+
+        with mock.patch.object(check_updates.os, 'replace', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                checker._save_tracked_data()
+
+        self.assertFalse(os.path.exists(self.tracked_file + '.tmp'))
+        self.assertFalse(os.path.exists(self.tracked_file))
+
+
+class MattermostNotificationTest(CheckerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.checker = self.make_checker(mattermost_webhook='https://mattermost.example/hooks/test')
+        self.checker._http.post = mock.Mock()
+
+    def make_update(self, index):
+        return {
+            'name': f'Game {index}',
+            'app_id': str(index),
+            'old_version': '100',
+            'new_version': '101',
+            'update_time': '2025-10-29T12:00:00'
+        }
+
+    def posted_texts(self):
+        return [call.kwargs['json']['text'] for call in self.checker._http.post.call_args_list]
+
+    def test_single_update_text(self):
+        self.checker._send_notifications([self.make_update(440)])
+
+        self.assertEqual(self.posted_texts(), [
+            "### Steam Game Build Update Detected!\n\n"
+            "**Game:** Game 440\n"
+            "**App ID:** 440\n"
+            "**Old Version:** `100`\n"
+            "**New Version:** `101`\n"
+            "**Detected:** 2025-10-29T12:00:00\n"
+            "**Steam Store:** https://store.steampowered.com/app/440/\n"
+            "**SteamDB:** https://steamdb.info/app/440/patchnotes/"
+        ])
+
+    def test_updates_are_batched_per_post(self):
+        updates = [self.make_update(index) for index in range(MATTERMOST_UPDATES_PER_POST + 1)]
+        self.checker._send_notifications(updates)
+        texts = self.posted_texts()
+
+        self.assertEqual(len(texts), 2)
+        self.assertTrue(texts[0].startswith(f"### {MATTERMOST_UPDATES_PER_POST} Steam Game Build Updates Detected!"))
+        self.assertEqual(texts[0].count("**Game:**"), MATTERMOST_UPDATES_PER_POST)
+        self.assertTrue(texts[1].startswith("### Steam Game Build Update Detected!\n\n**Game:** Game 20\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
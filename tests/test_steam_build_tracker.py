@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Tests for the SteamCMD output parsing and session handling in steam_build_tracker
+
+Parser tests feed canned app_info output; tracker tests run fake_steamcmd.py
+in place of SteamCMD.
+
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import os
+import shlex
+import sqlite3
+import stat
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steam_build_tracker import BuildInfo, RateLimiter, SteamCMDTracker, VDFStreamParser
+
+FAKE_STEAMCMD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_steamcmd.py')
+
+APP_440 = b'''AppID : 440, change number : 1000440/0, last change : Tue Oct 28 21:38:50 2025
+"440"
+{
+\t"common"
+\t{
+\t\t"name"\t\t"Team Fortress 2"
+\t\t"public"\t\t"1"
+\t}
+\t"depots"
+\t{
+\t\t"441"
+\t\t{
+\t\t\t"manifests"
+\t\t\t{
+\t\t\t\t"public"
+\t\t\t\t{
+\t\t\t\t\t"gid"\t\t"2286724010119636077"
+\t\t\t\t}
+\t\t\t}
+\t\t}
+\t\t"442"
+\t\t{
+\t\t\t"manifests"
+\t\t\t{
+\t\t\t\t"public"
+\t\t\t\t{
+\t\t\t\t\t"gid"\t\t"1118032470228587934"
+\t\t\t\t}
+\t\t\t}
+\t\t}
+\t\t"branches"
+\t\t{
+\t\t\t"public"
+\t\t\t{
+\t\t\t\t"buildid"\t\t"20565005"
+\t\t\t}
+\t\t}
+\t}
+}
+'''
+
+
+def make_steamcmd(directory, *options):
+    """Write an executable that runs fake_steamcmd.py with options, returns its path"""
+    path = os.path.join(directory, 'steamcmd')
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\n')
+        f.write(f'exec {shlex.quote(sys.executable)} {shlex.quote(FAKE_STEAMCMD)} '
+                f'{" ".join(options)} "$@"\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+def feed_lines(parser, output):
+    """Feed output to parser line by line, returns the number of lines fed before it was done"""
+    lines = output.splitlines(keepends=True)
+    for count, line in enumerate(lines, 1):
+        parser.feed(line)
+        if parser.done:
+            return count
+    return len(lines)
+
+
+class VDFStreamParserTest(unittest.TestCase):
+
+    def test_parses_build_id_and_depot_manifests(self):
+        parser = VDFStreamParser()
+        feed_lines(parser, APP_440.split(b'\n', 1)[1])
+
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.build_id, '20565005')
+        self.assertEqual(parser.depot_manifests, {'441': '2286724010119636077', '442': '1118032470228587934'})
+        self.assertEqual(parser.manifest_ids, ['2286724010119636077', '1118032470228587934'])
+
+    def test_strings_split_across_lines(self):
+        output = (b'"440"\n{\n\t"common"\n\t{\n\t\t"description"\t\t"first line\n'
+                  b'} not a brace\n"\n\t}\n\t"depots"\n\t{\n\t\t"branches"\n\t\t{\n\t\t\t"public"\n'
+                  b'\t\t\t{\n\t\t\t\t"buildid"\t\t"123')
+        parser = VDFStreamParser()
+        parser.feed(output)
+        parser.feed(b'45"\n\t\t\t}\n\t\t}\n\t}\n}\n')
+
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.build_id, '12345')
+
+    def test_byte_by_byte_feed_matches_line_feed(self):
+        body = APP_440.split(b'\n', 1)[1]
+        parser = VDFStreamParser()
+        for i in range(len(body)):
+            parser.feed(body[i:i + 1])
+
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.build_id, '20565005')
+        self.assertEqual(len(parser.depot_manifests), 2)
+
+    def test_without_detail_stops_at_build_id(self):
+        body = APP_440.split(b'\n', 1)[1]
+        parser = VDFStreamParser(detail=False)
+        fed = feed_lines(parser, body)
+
+        self.assertTrue(parser.done)
+        self.assertLess(fed, len(body.splitlines()))
+        self.assertEqual(parser.build_id, '20565005')
+        # Only the first depot's manifest, enough for the build ID fallback
+        self.assertEqual(parser.depot_manifests, {'441': '2286724010119636077'})
+
+    def test_skip_records_nothing_but_finds_block_end(self):
+        body = APP_440.split(b'\n', 1)[1]
+        parser = VDFStreamParser(skip=True)
+        fed = feed_lines(parser, body + b'"730"\n{\n}\n')
+
+        self.assertTrue(parser.done)
+        self.assertEqual(fed, len(body.splitlines()))
+        self.assertIsNone(parser.build_id)
+        self.assertEqual(parser.depot_manifests, {})
+
+    def test_ignores_public_gid_outside_depots(self):
+        output = (b'"440"\n{\n\t"config"\n\t{\n\t\t"public"\n\t\t{\n\t\t\t"gid"\t\t"999"\n\t\t}\n\t}\n'
+                  b'\t"depots"\n\t{\n\t\t"branches"\n\t\t{\n\t\t\t"public"\n\t\t\t{\n'
+                  b'\t\t\t\t"buildid"\t\t"1"\n\t\t\t}\n\t\t}\n\t}\n}\n')
+        parser = VDFStreamParser()
+        feed_lines(parser, output)
+
+        self.assertEqual(parser.build_id, '1')
+        self.assertEqual(parser.manifest_ids, [])
+
+
+class ParseAppBlocksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = SteamCMDTracker(steamcmd_path=FAKE_STEAMCMD, cache_ttl=0)
+        self.closed = False
+
+    def lines(self, output):
+        try:
+            yield from output.splitlines(keepends=True)
+        finally:
+            self.closed = True
+
+    def test_missing_app_is_none(self):
+        output = APP_440 + b'No app info for AppID 999 found, requesting...\n'
+        results = self.tracker._parse_app_blocks(self.lines(output), ['440', '999'])
+
+        self.assertEqual(results['440'].build_id, '20565005')
+        self.assertEqual(results['440'].change_number, '1000440')
+        self.assertIsNone(results['999'])
+
+    def test_block_without_banner(self):
+        output = APP_440.split(b'\n', 1)[1]
+        results = self.tracker._parse_app_blocks(self.lines(output), ['440'])
+
+        self.assertEqual(results['440'].build_id, '20565005')
+        self.assertIsNone(results['440'].change_number)
+
+    def test_closes_lines_once_all_apps_are_done(self):
+        output = APP_440 + b'this line is never read\n'
+        lines = self.lines(output)
+        self.tracker._parse_app_blocks(lines, ['440'])
+
+        self.assertTrue(self.closed)
+
+    def test_unchanged_change_number_reuses_cached(self):
+        cached = BuildInfo(
+            app_id='440', build_id='cached', manifest_ids=(), depot_manifests={},
+            primary_manifest=None, change_number='1000440', checked_at=None
+        )
+        results = self.tracker._parse_app_blocks(self.lines(APP_440), ['440'], {'440': cached})
+
+        self.assertEqual(results['440'].build_id, 'cached')
+        self.assertIsNotNone(results['440'].checked_at)
+
+
+@unittest.skipIf(sys.platform == 'win32', "fake steamcmd is started through a shell script")
+class SteamCMDTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def make_tracker(self, *options, **kwargs):
+        kwargs.setdefault('rate_limiter', RateLimiter(rate_per_sec=1000, burst=1000))
+        kwargs.setdefault('cache_ttl', 0)
+        tracker = SteamCMDTracker(steamcmd_path=make_steamcmd(self.tmp_dir.name, *options), **kwargs)
+        self.addCleanup(tracker.close)
+        return tracker
+
+    def test_one_shot_missing_app_is_none(self):
+        tracker = self.make_tracker(persistent=False)
+        results = tracker.get_build_info_batch(['440', '999'])
+
+        self.assertEqual(results['440'].build_id, '20565005')
+        self.assertIn('999', results)
+        self.assertIsNone(results['999'])
+
+    def test_one_shot_failed_run_leaves_missing_app_out(self):
+        tracker = self.make_tracker('--exit-code 1', persistent=False)
+        results = tracker.get_build_info_batch(['440', '999'])
+
+        self.assertEqual(results['440'].build_id, '20565005')
+        self.assertNotIn('999', results)
+
+    def test_session_missing_app_is_none(self):
+        tracker = self.make_tracker()
+        results = tracker.get_build_info_batch(['440', '999'])
+
+        self.assertTrue(tracker.persistent)
+        self.assertEqual(results['440'].build_id, '20565005')
+        self.assertIsNone(results['999'])
+
+    def test_session_drains_to_sentinel_after_early_close(self):
+        tracker = self.make_tracker()
+
+        lines = tracker._query_session(['440', '730'])
+        next(lines)
+        lines.close()
+
+        # The rest of the first query's output must not leak into the next one
+        results = tracker.get_build_info_batch(['730'])
+        self.assertTrue(tracker.persistent)
+        self.assertEqual(results['730'].build_id, '20535897')
+
+    def test_session_is_reused_across_queries(self):
+        tracker = self.make_tracker()
+        tracker.get_build_info_batch(['440'])
+        session = tracker._session
+        tracker.get_build_info_batch(['730'])
+
+        self.assertIsNotNone(session)
+        self.assertIs(tracker._session, session)
+
+    def test_failed_login_falls_back_to_one_shot(self):
+        tracker = self.make_tracker('--fail-login')
+        results = tracker.get_build_info_batch(['440'])
+
+        self.assertFalse(tracker.persistent)
+        # The one-shot run fails to log in too, so nothing is reported, not even None
+        self.assertEqual(results, {})
+
+    def test_missing_sentinel_falls_back_to_one_shot(self):
+        tracker = self.make_tracker('--no-echo')
+        tracker.LOGIN_TIMEOUT = 2
+        results = tracker.get_build_info_batch(['440'])
+
+        self.assertFalse(tracker.persistent)
+        self.assertEqual(results['440'].build_id, '20565005')
+
+
+
+@unittest.skipIf(sys.platform == 'win32', "fake steamcmd is started through a shell script")
+class DiskCacheTest(unittest.TestCase):
+    """
+    The on-disk cache, shared between a tracker that queries the fake SteamCMD
+    and a second one whose SteamCMD doesn't exist, so it only sees cache hits
+    """
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_path = os.path.join(tmp_dir.name, 'build_cache.db')
+        self.steamcmd = make_steamcmd(tmp_dir.name)
+        self.missing_steamcmd = os.path.join(tmp_dir.name, 'no-steamcmd')
+
+    def make_tracker(self, steamcmd_path, cache_ttl=300.0):
+        tracker = SteamCMDTracker(
+            steamcmd_path=steamcmd_path, persistent=False, cache_ttl=cache_ttl,
+            cache_path=self.cache_path, rate_limiter=RateLimiter(rate_per_sec=1000, burst=1000)
+        )
+        self.addCleanup(tracker.close)
+        return tracker
+
+    def set_checked_at(self, app_id, checked_at):
+        with sqlite3.connect(self.cache_path) as db:
+            db.execute('UPDATE builds SET checked_at = ? WHERE app_id = ?', (checked_at, app_id))
+        db.close()
+
+    def test_hit_from_another_tracker(self):
+        build_info = self.make_tracker(self.steamcmd).get_build_info('440')
+        cached = self.make_tracker(self.missing_steamcmd).get_build_info('440')
+
+        self.assertEqual(cached, build_info)
+        self.assertEqual(cached.manifest_ids, build_info.manifest_ids)
+        self.assertEqual(dict(cached.depot_manifests), dict(build_info.depot_manifests))
+
+    def test_row_without_detail_does_not_satisfy_detail_lookup(self):
+        self.make_tracker(self.steamcmd).get_build_info('440', detail=False)
+        tracker = self.make_tracker(self.missing_steamcmd)
+
+        self.assertIsNotNone(tracker.get_build_info('440', detail=False))
+        self.assertIsNone(tracker.get_build_info('440', detail=True))
+
+    def test_expiry_uses_wall_clock_checked_at(self):
+        self.make_tracker(self.steamcmd, cache_ttl=300).get_build_info('440')
+
+        self.set_checked_at('440', time.time() - 250)
+        self.assertIsNotNone(self.make_tracker(self.missing_steamcmd, cache_ttl=300).get_build_info('440'))
+
+        self.set_checked_at('440', time.time() - 350)
+        self.assertIsNone(self.make_tracker(self.missing_steamcmd, cache_ttl=300).get_build_info('440'))
+
+    def test_disk_hit_keeps_its_age_in_memory(self):
+        self.make_tracker(self.steamcmd).get_build_info('440')
+        self.set_checked_at('440', time.time() - 100)
+
+        tracker = self.make_tracker(self.missing_steamcmd)
+        tracker.get_build_info('440')
+        retrieved_at, _, has_detail = tracker._cache['440']
+
+        self.assertAlmostEqual(retrieved_at, time.monotonic() - 100, delta=5)
+        self.assertTrue(has_detail)
+
+    def test_invalidate_deletes_rows(self):
+        tracker = self.make_tracker(self.steamcmd)
+        tracker.get_build_info_batch(['440', '730'])
+
+        tracker.invalidate('440')
+        self.assertIsNone(self.make_tracker(self.missing_steamcmd).get_build_info('440'))
+        self.assertIsNotNone(self.make_tracker(self.missing_steamcmd).get_build_info('730'))
+
+        tracker.invalidate()
+        with sqlite3.connect(self.cache_path) as db:
+            count, = db.execute('SELECT COUNT(*) FROM builds').fetchone()
+        db.close()
+        self.assertEqual(count, 0)
+
+    def test_invalidate_does_not_create_cache_file(self):
+        self.make_tracker(self.steamcmd).invalidate()
+
+        self.assertFalse(os.path.exists(self.cache_path))
+
+
+if __name__ == '__main__':
+    unittest.main()